@@ -2,7 +2,9 @@
 from dataiku.llm.agent_tools import BaseAgentTool
 from utils.logging import logger
 from utils.google_drive import GoogleDriveUtils
+import fastjsonschema
 import json
+import logging
 import os
 
 
@@ -33,82 +35,52 @@ class GoogleDriveTool(BaseAgentTool):
         """
         try:
             # Get the access token from the configuration
-            access_token = self.google_drive_auth["access_token"]
+            self.access_token = self.google_drive_auth["access_token"]
             
-            # Create the Drive service using the utility class
-            self.drive_service = GoogleDriveUtils.create_drive_service(access_token)
+            # Create the Drive service using the utility class, so that a bad configuration fails early
+            GoogleDriveUtils.create_drive_service(self.access_token)
         except Exception as e:
-            logger.error(f"Failed to initialize Google Drive service: {str(e)}")
+            logger.error("Failed to initialize Google Drive service: %s", e)
             raise
 
+    @property
+    def drive_service(self):
+        """
+        The Google Drive service of the calling thread for the access token.
+        It is looked up on each use rather than kept: Drive services cannot be shared across threads,
+        and a service dropped after its token was rejected must be rebuilt.
+        """
+        return GoogleDriveUtils.create_drive_service(self.access_token)
+
     def get_descriptor(self, tool):
-        logger.debug("Generating descriptor for the Google Drive tool.")
-        return {
-            "description": "Interacts with Google Drive to search for files, get file details, and download files",
-            "inputSchema": {
-                "$id": "https://dataiku.com/agents/tools/google-drive/input",
-                "title": "Input for the Google Drive tool",
-                "type": "object",
-                "properties": {
-                    "action": {
-                        "type": "string",
-                        "enum": ["search_files", "get_file_details", "download_file", "list_files", "upload_file", "delete_file", "get_file_content"],
-                        "description": "The action to perform (search_files, get_file_details, download_file, list_files, upload_file, delete_file, or get_file_content)"
-                    },
-                    "query": {
-                        "type": "string",
-                        "description": "Search query for files (required for search_files action)"
-                    },
-                    "file_id": {
-                        "type": "string",
-                        "description": "Google Drive file ID (required for get_file_details, download_file, delete_file, and get_file_content actions)"
-                    },
-                    "mime_type": {
-                        "type": "string",
-                        "description": "MIME type for file download or export (optional for download_file and get_file_content actions)"
-                    },
-                    "folder_id": {
-                        "type": "string",
-                        "description": "Google Drive folder ID (optional for list_files action)"
-                    },
-                    "file_path": {
-                        "type": "string",
-                        "description": "Path to the file (required for upload_file action)"
-                    },
-                    "page_size": {
-                        "type": "integer",
-                        "description": "The maximum number of results to return",
-                        "default": 10
-                    }
-                },
-                "required": ["action"]
-            }
-        }
+        logger.debug("Returning descriptor for the Google Drive tool.")
+        return self._DESCRIPTOR
 
     def invoke(self, input, trace):
         args = input["input"]
+
+        # Check the action and the fields it requires against the input schema
+        try:
+            self._validate_input(args)
+        except fastjsonschema.JsonSchemaValueException as e:
+            logger.error("Invalid input: %s", e.message)
+            raise ValueError(f"Invalid input: {e.message}")
+
         action = args["action"]
 
-        logger.info(f"Invoking action: {action}")
-        logger.debug(f"Input arguments: {args}")
+        logger.info("Invoking action: %s", action)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Input arguments: %r", args)
 
-        if action == "search_files":
-            return self.search_files(args)
-        elif action == "get_file_details":
-            return self.get_file_details(args)
-        elif action == "download_file":
-            return self.download_file(args)
-        elif action == "list_files":
-            return self.list_files(args)
-        elif action == "upload_file":
-            return self.upload_file(args)
-        elif action == "delete_file":
-            return self.delete_file(args)
-        elif action == "get_file_content":
-            return self.get_file_content(args)
-        else:
-            logger.error(f"Invalid action: {action}")
-            raise ValueError(f"Invalid action: {action}")
+        try:
+            return self._ACTIONS[action](self, args)
+        except Exception as e:
+            # Stop reusing the cached Drive service once Google Drive rejects its token
+            # (HttpError carries the status in resp, aiohttp errors directly)
+            status = getattr(getattr(e, "resp", None), "status", None) or getattr(e, "status", None)
+            if status == 401:
+                GoogleDriveUtils.invalidate_service(self.access_token)
+            raise
 
     def search_files(self, args):
         """
@@ -121,11 +93,8 @@ class GoogleDriveTool(BaseAgentTool):
             Dictionary containing the search results.
         """
         logger.info("Starting 'search_files' action.")
-        logger.debug(f"Input arguments: {args}")
-        if "query" not in args:
-            logger.error("Missing required field: query")
-            raise ValueError("Missing required field: query")
-
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Input arguments: %r", args)
         try:
             # Get the search query
             query = args["query"]
@@ -143,7 +112,7 @@ class GoogleDriveTool(BaseAgentTool):
                 }
             }
         except Exception as e:
-            logger.error(f"Error searching for files: {str(e)}")
+            logger.error("Error searching for files: %s", e)
             raise
 
     def list_files(self, args):
@@ -157,7 +126,8 @@ class GoogleDriveTool(BaseAgentTool):
             Dictionary containing the list of files.
         """
         logger.info("Starting 'list_files' action.")
-        logger.debug(f"Input arguments: {args}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Input arguments: %r", args)
         try:
             # Get the folder ID if provided
             folder_id = args.get("folder_id")
@@ -175,7 +145,7 @@ class GoogleDriveTool(BaseAgentTool):
                 }
             }
         except Exception as e:
-            logger.error(f"Error listing files: {str(e)}")
+            logger.error("Error listing files: %s", e)
             raise
 
     def get_file_details(self, args):
@@ -183,18 +153,27 @@ class GoogleDriveTool(BaseAgentTool):
         Get details of a file in Google Drive.
         
         Args:
-            args: Dictionary containing the file ID.
+            args: Dictionary containing the file ID (or a list of file IDs in file_ids).
             
         Returns:
             Dictionary containing the file details.
         """
         logger.info("Starting 'get_file_details' action.")
-        logger.debug(f"Input arguments: {args}")
-        if "file_id" not in args:
-            logger.error("Missing required field: file_id")
-            raise ValueError("Missing required field: file_id")
-
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Input arguments: %r", args)
         try:
+            # Batch the lookups when a list of IDs is given
+            file_ids = args.get("file_ids")
+            if file_ids is not None:
+                files_details = GoogleDriveUtils.batch_get_details(self.drive_service, file_ids)
+                
+                return {
+                    "output": {
+                        "message": f"Retrieved details for {len(files_details)} files",
+                        "files": files_details
+                    }
+                }
+            
             # Get the file ID
             file_id = args["file_id"]
             
@@ -208,7 +187,7 @@ class GoogleDriveTool(BaseAgentTool):
                 }
             }
         except Exception as e:
-            logger.error(f"Error getting file details: {str(e)}")
+            logger.error("Error getting file details: %s", e)
             raise
 
     def get_file_content(self, args):
@@ -222,11 +201,8 @@ class GoogleDriveTool(BaseAgentTool):
             Dictionary containing the file content and metadata.
         """
         logger.info("Starting 'get_file_content' action.")
-        logger.debug(f"Input arguments: {args}")
-        if "file_id" not in args:
-            logger.error("Missing required field: file_id")
-            raise ValueError("Missing required field: file_id")
-
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Input arguments: %r", args)
         try:
             # Get the file ID and MIME type
             file_id = args["file_id"]
@@ -244,7 +220,7 @@ class GoogleDriveTool(BaseAgentTool):
                 }
             }
         except Exception as e:
-            logger.error(f"Error getting file content: {str(e)}")
+            logger.error("Error getting file content: %s", e)
             raise
 
     def download_file(self, args):
@@ -252,22 +228,33 @@ class GoogleDriveTool(BaseAgentTool):
         Download a file from Google Drive.
         
         Args:
-            args: Dictionary containing the file ID and optional MIME type.
+            args: Dictionary containing the file ID (or a list of file IDs in file_ids) and optional MIME type.
             
         Returns:
             Dictionary containing the file content and metadata.
         """
         logger.info("Starting 'download_file' action.")
-        logger.debug(f"Input arguments: {args}")
-        if "file_id" not in args:
-            logger.error("Missing required field: file_id")
-            raise ValueError("Missing required field: file_id")
-
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Input arguments: %r", args)
         try:
-            # Get the file ID and MIME type
-            file_id = args["file_id"]
+            # Get the MIME type
             mime_type = args.get("mime_type")
             
+            # Download several files concurrently when a list of IDs is given
+            file_ids = args.get("file_ids")
+            if file_ids is not None:
+                files_data = GoogleDriveUtils.download_many(self.access_token, file_ids, mime_type)
+                
+                return {
+                    "output": {
+                        "message": f"Downloaded {len(files_data)} files",
+                        "files": files_data
+                    }
+                }
+            
+            # Get the file ID
+            file_id = args["file_id"]
+            
             # Use the utility class to download the file
             file_data = GoogleDriveUtils.download_file(self.drive_service, file_id, mime_type)
             
@@ -280,7 +267,7 @@ class GoogleDriveTool(BaseAgentTool):
                 }
             }
         except Exception as e:
-            logger.error(f"Error downloading file: {str(e)}")
+            logger.error("Error downloading file: %s", e)
             raise
             
     def upload_file(self, args):
@@ -294,11 +281,8 @@ class GoogleDriveTool(BaseAgentTool):
             Dictionary containing the uploaded file ID.
         """
         logger.info("Starting 'upload_file' action.")
-        logger.debug(f"Input arguments: {args}")
-        if "file_path" not in args:
-            logger.error("Missing required field: file_path")
-            raise ValueError("Missing required field: file_path")
-
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Input arguments: %r", args)
         try:
             # Get the file path and folder ID
             file_path = args["file_path"]
@@ -314,7 +298,7 @@ class GoogleDriveTool(BaseAgentTool):
                 }
             }
         except Exception as e:
-            logger.error(f"Error uploading file: {str(e)}")
+            logger.error("Error uploading file: %s", e)
             raise
             
     def delete_file(self, args):
@@ -322,18 +306,27 @@ class GoogleDriveTool(BaseAgentTool):
         Delete a file from Google Drive.
         
         Args:
-            args: Dictionary containing the file ID.
+            args: Dictionary containing the file ID (or a list of file IDs in file_ids).
             
         Returns:
             Dictionary containing the result of the operation.
         """
         logger.info("Starting 'delete_file' action.")
-        logger.debug(f"Input arguments: {args}")
-        if "file_id" not in args:
-            logger.error("Missing required field: file_id")
-            raise ValueError("Missing required field: file_id")
-
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Input arguments: %r", args)
         try:
+            # Batch the deletions when a list of IDs is given
+            file_ids = args.get("file_ids")
+            if file_ids is not None:
+                GoogleDriveUtils.batch_delete(self.drive_service, file_ids)
+                
+                return {
+                    "output": {
+                        "message": f"Deleted {len(file_ids)} files",
+                        "success": True
+                    }
+                }
+            
             # Get the file ID
             file_id = args["file_id"]
             
@@ -347,6 +340,96 @@ class GoogleDriveTool(BaseAgentTool):
                 }
             }
         except Exception as e:
-            logger.error(f"Error deleting file: {str(e)}")
+            logger.error("Error deleting file: %s", e)
             raise
 
+    # Action handlers, by action name
+    _ACTIONS = {
+        "search_files": search_files,
+        "get_file_details": get_file_details,
+        "download_file": download_file,
+        "list_files": list_files,
+        "upload_file": upload_file,
+        "delete_file": delete_file,
+        "get_file_content": get_file_content
+    }
+
+    # Tool descriptor, built once as it only depends on the class
+    _DESCRIPTOR = {
+        "description": "Interacts with Google Drive to search for files, get file details, and download files",
+        "inputSchema": {
+            "$id": "https://dataiku.com/agents/tools/google-drive/input",
+            "title": "Input for the Google Drive tool",
+            "type": "object",
+            "properties": {
+                "action": {
+                    "type": "string",
+                    "enum": list(_ACTIONS),
+                    "description": f"The action to perform ({', '.join(_ACTIONS)})"
+                },
+                "query": {
+                    "type": "string",
+                    "description": "Search query for files (required for search_files action)"
+                },
+                "file_id": {
+                    "type": "string",
+                    "description": "Google Drive file ID (required for get_file_details, download_file, delete_file, and get_file_content actions, unless file_ids is given)"
+                },
+                "file_ids": {
+                    "type": "array",
+                    "items": {
+                        "type": "string"
+                    },
+                    "minItems": 1,
+                    "description": "List of Google Drive file IDs, to process several files at once instead of a single file_id (optional for get_file_details, download_file and delete_file actions)"
+                },
+                "mime_type": {
+                    "type": "string",
+                    "description": "MIME type for file download or export (optional for download_file and get_file_content actions)"
+                },
+                "folder_id": {
+                    "type": "string",
+                    "description": "Google Drive folder ID (optional for list_files action)"
+                },
+                "file_path": {
+                    "type": "string",
+                    "description": "Path to the file (required for upload_file action)"
+                },
+                "page_size": {
+                    "type": "integer",
+                    "description": "The maximum number of results to return",
+                    "default": 10
+                }
+            },
+            "required": ["action"]
+        }
+    }
+
+    # Fields required by each action, on top of the action itself
+    _REQUIRED_FIELDS = {
+        "search_files": ["query"],
+        "upload_file": ["file_path"],
+        "get_file_content": ["file_id"]
+    }
+
+    # Actions requiring either a file_id or a list of file_ids
+    _MULTI_FILE_ACTIONS = ["get_file_details", "download_file", "delete_file"]
+
+    # Input schema extended with the fields required by each action, compiled once into a validation function.
+    # Defaults are not filled in, as validation would then modify the input of the caller.
+    _validate_input = staticmethod(fastjsonschema.compile(dict(
+        _DESCRIPTOR["inputSchema"],
+        allOf=[
+            {
+                "if": {"properties": {"action": {"const": action}}},
+                "then": {"required": fields}
+            }
+            for action, fields in _REQUIRED_FIELDS.items()
+        ] + [
+            {
+                "if": {"properties": {"action": {"enum": _MULTI_FILE_ACTIONS}}},
+                "then": {"oneOf": [{"required": ["file_id"]}, {"required": ["file_ids"]}]},
+                "else": {"not": {"required": ["file_ids"]}}
+            }
+        ]
+    ), use_default=False))
\ No newline at end of file
@@ -0,0 +1,91 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# Directory of the local caches, readable only by the current user as they hold private file names
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "gdrive")
+
+
+def make_private_dir(path):
+    """
+    Create a cache directory readable only by the current user, along with CACHE_DIR.
+
+    Args:
+        path: The path of the directory, CACHE_DIR or one of its subdirectories.
+    """
+    # makedirs only applies the mode to the last directory it creates, and leaves existing ones as they are
+    for directory in (CACHE_DIR, path):
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.chmod(directory, 0o700)
+
+
+class MemoryCache:
+    """
+    Thread-safe in-process LRU cache, with an optional time-to-live for its entries.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        """
+        Args:
+            maxsize: The maximum number of entries, the least recently used being evicted first.
+            ttl: The number of seconds an entry stays valid (optional, entries never expire by default).
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        Get a cached value.
+
+        Args:
+            key: The key of the entry.
+            default: The value to return if the entry is missing or expired.
+
+        Returns:
+            The cached value, or default.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Cache a value, evicting the least recently used entry if the cache is full.
+
+        Args:
+            key: The key of the entry.
+            value: The value to cache.
+        """
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        """
+        Remove cached entries.
+
+        Args:
+            predicate: A function called with each key, returning True for the entries to remove (optional, all entries are removed by default).
+        """
+        with self._lock:
+            if predicate is None:
+                self._entries.clear()
+                return
+
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
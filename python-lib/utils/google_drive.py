@@ -1,10 +1,116 @@
 import os
+import re
 import json
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
-from io import BytesIO
+import codecs
+import functools
+import time
+import hashlib
+import asyncio
+import threading
+import weakref
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+from utils import gdrive_cache, metadata_cache, orjson_patch
 from utils.logging import logger
+from utils.retry import drive_retry, backoff_delay, get_retry_after, MAX_DELAY, MAX_TRIES, RETRYABLE_STATUSES
+
+# The Google client libraries and aiohttp are imported by the methods using them,
+# so that importing this module stays cheap for processes that never call Google Drive
+
+DRIVE_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+
+# Google APIs only compress responses for clients whose user agent contains "gzip"
+GZIP_HEADERS = {
+    "Accept-Encoding": "gzip",
+    "User-Agent": "google-drive-tool (gzip)"
+}
+
+# Google Drive accepts at most 100 calls in a single batch request
+BATCH_SIZE = 100
+
+# Files smaller than this are downloaded in a single request, larger ones in chunks of DOWNLOAD_CHUNK_SIZE
+SMALL_FILE_SIZE = 10 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 20 * 1024 * 1024
+
+# Files smaller than this are sent in a single multipart upload, larger ones in resumable chunks of UPLOAD_CHUNK_SIZE
+RESUMABLE_UPLOAD_THRESHOLD = 5 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Fields requested from the Drive API
+_LIST_FIELDS = "id, name, mimeType, modifiedTime, size"
+_LIST_FIELDS_TMPL = "files({}), nextPageToken"
+_DETAILS_FIELDS = "id, name, mimeType, modifiedTime, size, description, webViewLink"
+_DOWNLOAD_META_FIELDS = "id, name, mimeType, size"
+
+# MIME type prefixes and MIME types of text-based files
+_TEXT_PREFIXES = ('text/',)
+_TEXT_MIME_TYPES = frozenset({
+    'application/json',
+    'application/xml',
+    'application/javascript',
+    'application/x-yaml',
+    'application/x-httpd-php',
+    'application/x-sh',
+    'application/x-python',
+    'application/x-ruby',
+    'application/x-java',
+    'application/x-c++',
+    'application/x-csharp',
+    'application/x-html',
+    'application/x-css',
+    'application/x-markdown',
+    'application/x-csv',
+    'application/x-tsv',
+    'application/x-tex',
+    'application/x-latex',
+    'application/x-rtf',
+    'application/x-plain'
+})
+
+# MIME types of Google Apps documents
+_GAPPS_PREFIX = 'application/vnd.google-apps'
+_GAPPS_DRAWING = 'application/vnd.google-apps.drawing'
+
+# Default export MIME type of each Google Apps document type, text/plain for the others
+_EXPORT_MIME_MAP = {
+    "application/vnd.google-apps.document": "text/markdown",
+    "application/vnd.google-apps.spreadsheet": "text/csv",
+    "application/vnd.google-apps.presentation": "text/plain"
+}
+
+# Drive file and folder IDs are URL-safe base64, which can be embedded in queries without escaping
+_DRIVE_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]+')
+_PARENTS_QUERY_TMPL = "'{}' in parents"
+
+# Maximum number of files Google Drive returns per page of a listing
+MAX_PAGE_SIZE = 1000
+
+# Timeout in seconds of the HTTP connections to Google Drive
+HTTP_TIMEOUT = 30
+
+# Maximum number of concurrent Drive requests, above which Google Drive starts rejecting them with rateLimitExceeded
+MAX_CONCURRENT_REQUESTS = 10
+
+# httplib2 is not thread-safe: each thread gets its own HTTP client, shared by all the Drive services
+# of that thread so that they reuse its open connections
+_thread_local = threading.local()
+
+# Drive services already built, keyed by thread and by a hash of their access token.
+# Keys hold the Thread object rather than its ident, which a new thread may reuse.
+_service_cache = gdrive_cache.MemoryCache(maxsize=32)
+
+# Worker threads of fetch_many, kept across calls so that their Drive services and connections are reused
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="gdrive")
+
+# In-process caches, keyed by Drive service so that results are never shared across credentials.
+# File metadata is keyed by (service, file ID, fields), each fields list mapping to one kind of value.
+_metadata_cache = gdrive_cache.MemoryCache(maxsize=4096, ttl=60.0)
+_search_cache = gdrive_cache.MemoryCache(maxsize=256, ttl=30.0)
+
+# Disk cache of the listings, shared by successive runs. Its keys include the hash of the token of the service,
+# recorded when the service is created: listings made with other services are not cached on disk.
+_listing_cache = metadata_cache.MetadataCache()
+_service_token_hashes = weakref.WeakKeyDictionary()
 
 class GoogleDriveUtils:
     """
@@ -23,19 +129,78 @@ class GoogleDriveUtils:
             A Google Drive service object.
         """
         try:
+            # Reuse the service already built for this token by the current thread
+            token_hash = GoogleDriveUtils._hash_token(access_token)
+            cache_key = (threading.current_thread(), token_hash)
+            drive_service = _service_cache.get(cache_key)
+            if drive_service is not None:
+                logger.debug("Reusing the Google Drive service created for this token")
+                return drive_service
+            
+            import google_auth_httplib2
+            from google.oauth2.credentials import Credentials
+            from googleapiclient.discovery import build
+            
+            orjson_patch.install()
+            
             # Create credentials object
             credentials = Credentials(access_token)
             
-            # Build the Drive API service
-            drive_service = build('drive', 'v3', credentials=credentials)
+            # Authorize the requests sent through the HTTP client of the current thread
+            authorized_http = google_auth_httplib2.AuthorizedHttp(credentials, http=GoogleDriveUtils._get_thread_http())
+            
+            # Build the Drive API service from the discovery document bundled with the client library
+            drive_service = build('drive', 'v3', http=authorized_http, static_discovery=True, cache_discovery=False)
+            _service_cache.set(cache_key, drive_service)
+            _service_token_hashes[drive_service] = token_hash
             logger.info("Google Drive service created successfully")
             return drive_service
         except Exception as e:
-            logger.error(f"Failed to create Google Drive service: {str(e)}")
+            logger.error("Failed to create Google Drive service: %s", e)
             raise
     
     @staticmethod
-    def search_files(drive_service, query, page_size=10):
+    def invalidate_service(access_token):
+        """
+        Forget the Drive services built for an access token, e.g. once Google Drive rejected it.
+        
+        Args:
+            access_token: The OAuth 2.0 access token.
+        """
+        token_hash = GoogleDriveUtils._hash_token(access_token)
+        _service_cache.invalidate(lambda key: key[1] == token_hash)
+        logger.info("Dropped the Google Drive services created for this token")
+    
+    @staticmethod
+    def _hash_token(access_token):
+        """
+        Hash an access token, so that the token itself is never used as a cache key.
+        
+        Args:
+            access_token: The OAuth 2.0 access token.
+            
+        Returns:
+            A truncated SHA-256 hex digest of the token.
+        """
+        return hashlib.sha256(access_token.encode('utf-8')).hexdigest()[:16]
+    
+    @staticmethod
+    def _get_thread_http():
+        """
+        Get the HTTP client shared by the Drive services of the current thread, creating it on first use.
+        
+        Returns:
+            The httplib2.Http instance of the current thread.
+        """
+        import httplib2
+        
+        http = getattr(_thread_local, 'http', None)
+        if http is None:
+            http = _thread_local.http = httplib2.Http(timeout=HTTP_TIMEOUT)
+        return http
+    
+    @staticmethod
+    def search_files(drive_service, query, page_size=10, fields=_LIST_FIELDS, raw=False):
         """
         Search for files in Google Drive.
         
@@ -43,40 +208,37 @@ class GoogleDriveUtils:
             drive_service: The Google Drive service.
             query: The search query.
             page_size: The maximum number of results to return.
+            fields: The file fields to request. Files are returned as sent by the API unless the default fields are requested.
+            raw: Whether to return the files as sent by the API, with camelCase keys, even for the default fields.
             
         Returns:
             A list of files matching the query.
         """
         try:
+            # Reuse the results of an identical recent search
+            cache_key = (drive_service, query, page_size, fields, raw)
+            formatted_files = _search_cache.get(cache_key)
+            if formatted_files is not None:
+                logger.info("Found %s cached files matching the query (requested: %s)", len(formatted_files), page_size)
+                return formatted_files
+            
             # Execute the search with the original query
-            logger.debug(f"Executing search with query: {query}, page_size: {page_size}")
-            results = drive_service.files().list(
-                q=query,
-                pageSize=page_size,
-                fields="files(id, name, mimeType, modifiedTime, size)"
-            ).execute()
-            
-            files = results.get('files', [])
-            logger.info(f"Found {len(files)} files matching the query (requested: {page_size})")
-            
-            # Format the results
-            formatted_files = []
-            for file in files:
-                formatted_files.append({
-                    "id": file.get('id'),
-                    "name": file.get('name'),
-                    "mime_type": file.get('mimeType'),
-                    "modified_time": file.get('modifiedTime'),
-                    "size": file.get('size')
-                })
+            logger.debug("Executing search with query: %s, page_size: %s", query, page_size)
+            files = GoogleDriveUtils._list_pages(drive_service, query, page_size, fields)
+            
+            # Format the results, unless the caller chose the fields or asked for the raw files
+            formatted_files = files if raw else GoogleDriveUtils._format_files(files, fields)
+            logger.info("Found %s files matching the query (requested: %s)", len(formatted_files), page_size)
+            
+            _search_cache.set(cache_key, formatted_files)
             
             return formatted_files
         except Exception as e:
-            logger.error(f"Error searching for files: {str(e)}")
+            logger.error("Error searching for files: %s", e)
             raise
     
     @staticmethod
-    def list_files(drive_service, folder_id=None, page_size=10):
+    def list_files(drive_service, folder_id=None, page_size=10, fields=_LIST_FIELDS, raw=False):
         """
         List files in Google Drive or in a specific folder.
         
@@ -84,81 +246,371 @@ class GoogleDriveUtils:
             drive_service: The Google Drive service.
             folder_id: The ID of the folder to list files from (optional).
             page_size: The maximum number of results to return.
+            fields: The file fields to request. Files are returned as sent by the API unless the default fields are requested.
+            raw: Whether to return the files as sent by the API, with camelCase keys, even for the default fields.
             
         Returns:
             A list of files in the specified folder or root.
         """
         try:
             # Build the query
-            query = f"'{folder_id}' in parents" if folder_id else None
+            query = GoogleDriveUtils._parents_query(folder_id) if folder_id else None
             
             # Execute the list operation
-            logger.debug(f"Listing files with folder_id: {folder_id}, page_size: {page_size}")
-            results = drive_service.files().list(
-                q=query,
-                pageSize=page_size,
-                fields="files(id, name, mimeType, modifiedTime, size)"
-            ).execute()
-            
-            files = results.get('files', [])
-            logger.info(f"Found {len(files)} files (requested: {page_size})")
-            
-            # Format the results
-            formatted_files = []
-            for file in files:
-                formatted_files.append({
-                    "id": file.get('id'),
-                    "name": file.get('name'),
-                    "mime_type": file.get('mimeType'),
-                    "modified_time": file.get('modifiedTime'),
-                    "size": file.get('size')
-                })
+            logger.debug("Listing files with folder_id: %s, page_size: %s", folder_id, page_size)
+            files = GoogleDriveUtils._list_pages(drive_service, query, page_size, fields, scope=folder_id)
+            
+            # Format the results, unless the caller chose the fields or asked for the raw files
+            formatted_files = files if raw else GoogleDriveUtils._format_files(files, fields)
+            logger.info("Found %s files (requested: %s)", len(formatted_files), page_size)
             
             return formatted_files
         except Exception as e:
-            logger.error(f"Error listing files: {str(e)}")
+            logger.error("Error listing files: %s", e)
             raise
     
     @staticmethod
-    def get_file_details(drive_service, file_id):
+    @functools.lru_cache(maxsize=256)
+    def _parents_query(folder_id):
+        """
+        Build the query listing the files of a folder.
+        
+        Args:
+            folder_id: The ID of the folder.
+            
+        Returns:
+            The Drive query.
+        """
+        if not _DRIVE_ID_PATTERN.fullmatch(folder_id):
+            raise ValueError(f"Invalid folder ID: {folder_id}")
+        
+        return _PARENTS_QUERY_TMPL.format(folder_id)
+    
+    @staticmethod
+    def _list_pages(drive_service, query, page_size, fields, scope=None):
+        """
+        List files page after page until page_size files are collected or no page is left.
+        Google Drive may return fewer files than requested in a page even when more match.
+        The listing is cached on disk for the services created by create_drive_service.
+        
+        Args:
+            drive_service: The Google Drive service.
+            query: The Drive query (optional).
+            page_size: The maximum number of files to return.
+            fields: The file fields to request.
+            scope: The ID of the listed folder, whose changes invalidate the cached listing (optional).
+            
+        Returns:
+            A list of the file resources.
+        """
+        # Reuse the listing made with the same token by a recent run
+        token_hash = _service_token_hashes.get(drive_service)
+        if token_hash is not None:
+            cache_key = metadata_cache.make_key(token_hash, query, page_size, fields)
+            files = _listing_cache.get(cache_key)
+            if files is not None:
+                logger.debug("Using the listing cached on disk for query: %s", query)
+                return files
+        
+        files = []
+        request = drive_service.files().list(
+            q=query,
+            pageSize=min(page_size, MAX_PAGE_SIZE),
+            fields=_LIST_FIELDS_TMPL.format(fields)
+        )
+        while request is not None and len(files) < page_size:
+            results = GoogleDriveUtils._execute(request)
+            files.extend(results.get('files', []))
+            
+            # Reuse the request with the next page token
+            request = drive_service.files().list_next(request, results)
+        
+        files = files[:page_size]
+        if token_hash is not None:
+            _listing_cache.set(cache_key, files, scope)
+        
+        return files
+    
+    @staticmethod
+    def get_file_details(drive_service, file_id, fields=_DETAILS_FIELDS):
         """
         Get details of a file in Google Drive.
         
         Args:
             drive_service: The Google Drive service.
             file_id: The ID of the file.
+            fields: The fields to request. The file is returned as sent by the API unless the default fields are requested.
             
         Returns:
             A dictionary containing the file details.
         """
         try:
+            # Return the fields chosen by the caller as is
+            if fields != _DETAILS_FIELDS:
+                logger.debug("Getting fields %s for file with ID: %s", fields, file_id)
+                return GoogleDriveUtils._fetch_file_metadata(drive_service, file_id, fields)
+            
+            # Use the details already retrieved by this process
+            cache_key = (drive_service, file_id, _DETAILS_FIELDS)
+            file_details = _metadata_cache.get(cache_key)
+            if file_details is not None:
+                logger.info("Retrieved in-memory details for file: %s", file_details.get('name'))
+                return file_details
+            
             # Get the file details
-            logger.debug(f"Getting details for file with ID: {file_id}")
-            file = drive_service.files().get(
+            logger.debug("Getting details for file with ID: %s", file_id)
+            file = GoogleDriveUtils._execute(drive_service.files().get(
                 fileId=file_id,
-                fields="id, name, mimeType, modifiedTime, size, description, webViewLink"
-            ).execute()
+                fields=_DETAILS_FIELDS
+            ))
+            
+            logger.info("Retrieved details for file: %s", file.get('name'))
+            
+            file_details = GoogleDriveUtils._format_file_details(file)
+            _metadata_cache.set(cache_key, file_details)
+            
+            return file_details
+        except Exception as e:
+            logger.error("Error getting file details: %s", e)
+            raise
+    
+    @staticmethod
+    def batch_get_details(drive_service, file_ids):
+        """
+        Get details of several files in Google Drive using batch requests.
+        
+        Args:
+            drive_service: The Google Drive service.
+            file_ids: The IDs of the files.
+            
+        Returns:
+            A list of dictionaries containing the file details, in the order of file_ids.
+        """
+        try:
+            logger.debug("Getting details for %s files in batch", len(file_ids))
+            files = GoogleDriveUtils.batch_execute(drive_service, {
+                file_id: drive_service.files().get(
+                    fileId=file_id,
+                    fields=_DETAILS_FIELDS
+                )
+                for file_id in file_ids
+            })
+            
+            logger.info("Retrieved details for %s files", len(files))
             
-            logger.info(f"Retrieved details for file: {file.get('name')}")
+            return [GoogleDriveUtils._format_file_details(files[file_id]) for file_id in file_ids]
+        except Exception as e:
+            logger.error("Error getting file details: %s", e)
+            raise
+    
+    @staticmethod
+    def _format_files(files, fields=_LIST_FIELDS):
+        """
+        Format the file resources returned by a Drive API listing.
+        The id, name and mimeType fields are always returned, the others are optional.
+        
+        Args:
+            files: The file resources.
+            fields: The file fields that were requested. Files with other fields than the default ones are returned as is.
             
-            # Format the file details
-            file_details = {
-                "id": file.get('id'),
-                "name": file.get('name'),
-                "mime_type": file.get('mimeType'),
+        Returns:
+            A list of dictionaries containing the file summaries.
+        """
+        if fields != _LIST_FIELDS:
+            return files
+        
+        return [
+            {
+                "id": file["id"],
+                "name": file["name"],
+                "mime_type": file["mimeType"],
                 "modified_time": file.get('modifiedTime'),
-                "size": file.get('size'),
-                "description": file.get('description'),
-                "web_view_link": file.get('webViewLink')
+                "size": file.get('size')
             }
+            for file in files
+        ]
+    
+    @staticmethod
+    def fetch_many(access_token, file_ids, fn):
+        """
+        Call a GoogleDriveUtils method on several files from the shared pool of MAX_CONCURRENT_REQUESTS threads.
+        
+        Args:
+            access_token: The OAuth 2.0 access token.
+            file_ids: The IDs of the files.
+            fn: The function to call with a Drive service and a file ID, e.g. GoogleDriveUtils.get_file_details.
             
-            return file_details
+        Returns:
+            A list of the results, in the order of file_ids.
+        """
+        def fetch(file_id):
+            # Each worker thread uses its own service, as they cannot be shared across threads
+            drive_service = GoogleDriveUtils.create_drive_service(access_token)
+            return fn(drive_service, file_id)
+        
+        return list(_executor.map(fetch, file_ids))
+    
+    @staticmethod
+    def get_many_details(access_token, file_ids):
+        """
+        Get details of several files in Google Drive with concurrent requests.
+        
+        Args:
+            access_token: The OAuth 2.0 access token.
+            file_ids: The IDs of the files.
+            
+        Returns:
+            A list of dictionaries containing the file details, in the order of file_ids.
+        """
+        try:
+            logger.debug("Getting details for %s files concurrently", len(file_ids))
+            files_details = GoogleDriveUtils.fetch_many(access_token, file_ids, GoogleDriveUtils.get_file_details)
+            logger.info("Retrieved details for %s files", len(files_details))
+            
+            return files_details
         except Exception as e:
-            logger.error(f"Error getting file details: {str(e)}")
+            logger.error("Error getting file details: %s", e)
             raise
     
     @staticmethod
-    def get_file_content(drive_service, file_id, mime_type=None):
+    def _format_file_details(file):
+        """
+        Format a file resource returned by the Drive API.
+        
+        Args:
+            file: The file resource.
+            
+        Returns:
+            A dictionary containing the file details.
+        """
+        return {
+            "id": file.get('id'),
+            "name": file.get('name'),
+            "mime_type": file.get('mimeType'),
+            "modified_time": file.get('modifiedTime'),
+            "size": file.get('size'),
+            "description": file.get('description'),
+            "web_view_link": file.get('webViewLink')
+        }
+    
+    @staticmethod
+    def _fetch_file_metadata(drive_service, file_id, fields):
+        """
+        Get file metadata, reusing the result of an identical request made in the last minute.
+        
+        Args:
+            drive_service: The Google Drive service.
+            file_id: The ID of the file.
+            fields: The fields to request.
+            
+        Returns:
+            The file resource returned by the Drive API.
+        """
+        cache_key = (drive_service, file_id, fields)
+        file = _metadata_cache.get(cache_key)
+        if file is None:
+            file = GoogleDriveUtils._execute(drive_service.files().get(
+                fileId=file_id,
+                fields=fields
+            ))
+            _metadata_cache.set(cache_key, file)
+        
+        return file
+    
+    @staticmethod
+    def _execute(request, idempotent=None):
+        """
+        Execute a Drive API request, retrying only this request on rate limiting and transient server errors.
+        Network errors are only retried for requests safe to repeat, as a create or a delete may have been
+        applied before the connection failed.
+        
+        Args:
+            request: The request, e.g. from files().get(), or a batch request.
+            idempotent: Whether the request is safe to repeat (optional, by default only GET requests are).
+            
+        Returns:
+            The response of the request.
+        """
+        if idempotent is None:
+            idempotent = getattr(request, 'method', None) == 'GET'
+        
+        return drive_retry(network_errors=idempotent)(request.execute)()
+    
+    @staticmethod
+    @drive_retry()
+    def _next_chunk(request):
+        """
+        Upload the next chunk of a resumable upload, retrying only this chunk on errors.
+        After a failure, the upload resumes from the last byte acknowledged by Google Drive.
+        
+        Args:
+            request: The resumable upload request.
+            
+        Returns:
+            A tuple of the upload progress and the file resource, which is None until the upload completes.
+        """
+        return request.next_chunk()
+    
+    @staticmethod
+    def batch_execute(drive_service, requests):
+        """
+        Execute Drive API requests in batches of up to BATCH_SIZE calls per HTTP request.
+        Media uploads and downloads, including exports, cannot be batched.
+        Calls failing with a retryable status are sent again in a new batch, the others are not repeated.
+        
+        Args:
+            drive_service: The Google Drive service.
+            requests: A dictionary of the requests to execute, by request ID.
+            
+        Returns:
+            A dictionary of the responses, by request ID.
+        """
+        from googleapiclient.errors import HttpError
+        
+        responses = {}
+        errors = {}
+        
+        def callback(request_id, response, exception):
+            if exception is not None:
+                errors[request_id] = exception
+            else:
+                responses[request_id] = response
+        
+        request_items = list(requests.items())
+        pending = request_items
+        
+        # A batch failing on a network error is only sent again if all its calls are safe to repeat
+        idempotent = all(request.method == 'GET' for request in requests.values())
+        for attempt in range(1, MAX_TRIES + 1):
+            for start in range(0, len(pending), BATCH_SIZE):
+                batch = drive_service.new_batch_http_request(callback=callback)
+                for request_id, request in pending[start:start + BATCH_SIZE]:
+                    batch.add(request, request_id=request_id)
+                GoogleDriveUtils._execute(batch, idempotent)
+            
+            # Send again the calls rejected by rate limiting or a transient server error, without the successful ones
+            pending = [
+                (request_id, request) for request_id, request in pending
+                if isinstance(errors.get(request_id), HttpError) and errors[request_id].resp.status in RETRYABLE_STATUSES
+            ]
+            if not pending or attempt == MAX_TRIES:
+                break
+            
+            delay = backoff_delay(attempt)
+            logger.warn("%s batched calls failed, retrying them in %.1fs (attempt %s/%s)", len(pending), delay, attempt, MAX_TRIES)
+            time.sleep(delay)
+            for request_id, _ in pending:
+                del errors[request_id]
+        
+        # Surface the first failed call, like the non-batched methods do
+        for request_id, _ in request_items:
+            if request_id in errors:
+                raise errors[request_id]
+        
+        return responses
+    
+    @staticmethod
+    def get_file_content(drive_service, file_id, mime_type=None, file_name=None, file_mime_type=None):
         """
         Get the content of a text-based file from Google Drive.
         Supports text files and Google Apps documents (excluding drawings).
@@ -167,48 +619,25 @@ class GoogleDriveUtils:
             drive_service: The Google Drive service.
             file_id: The ID of the file.
             mime_type: The MIME type for exporting Google Docs (optional).
+            file_name: The name of the file, e.g. from a listing (optional).
+            file_mime_type: The MIME type of the file, e.g. from a listing (optional). The file details are not requested when both are given.
             
         Returns:
             A dictionary containing the file content and metadata.
         """
         try:
-            # Get the file details first
-            logger.debug(f"Getting details for file with ID: {file_id}")
-            file = drive_service.files().get(
-                fileId=file_id,
-                fields="id, name, mimeType"
-            ).execute()
+            # Get the file details first, unless the caller already knows them
+            file = GoogleDriveUtils._get_download_metadata(drive_service, file_id, file_name, file_mime_type)
             
             file_name = file.get('name')
             file_mime_type = file.get('mimeType')
             
             # Check if the file is a Google Apps document (excluding drawings)
-            is_google_app = file_mime_type.startswith('application/vnd.google-apps')
-            is_drawing = file_mime_type == 'application/vnd.google-apps.drawing'
+            is_google_app = file_mime_type.startswith(_GAPPS_PREFIX)
+            is_drawing = file_mime_type == _GAPPS_DRAWING
             
             # Check if the file is a text-based file
-            is_text = file_mime_type.startswith('text/') or file_mime_type in [
-                'application/json',
-                'application/xml',
-                'application/javascript',
-                'application/x-yaml',
-                'application/x-httpd-php',
-                'application/x-sh',
-                'application/x-python',
-                'application/x-ruby',
-                'application/x-java',
-                'application/x-c++',
-                'application/x-csharp',
-                'application/x-html',
-                'application/x-css',
-                'application/x-markdown',
-                'application/x-csv',
-                'application/x-tsv',
-                'application/x-tex',
-                'application/x-latex',
-                'application/x-rtf',
-                'application/x-plain'
-            ]
+            is_text = file_mime_type.startswith(_TEXT_PREFIXES) or file_mime_type in _TEXT_MIME_TYPES
             
             # If not a text file or Google App (or is a drawing), raise an error
             if not (is_text or (is_google_app and not is_drawing)):
@@ -217,44 +646,23 @@ class GoogleDriveUtils:
             # If a specific MIME type is requested and the file is a Google Doc, export it
             if is_google_app:
                 # Determine the export MIME type based on the Google App type
-                if mime_type:
-                    export_mime_type = mime_type
-                else:
-                    if file_mime_type == "application/vnd.google-apps.document":
-                        export_mime_type = "text/markdown"
-                    elif file_mime_type == "application/vnd.google-apps.spreadsheet":
-                        export_mime_type = "text/csv"
-                    elif file_mime_type == "application/vnd.google-apps.presentation":
-                        export_mime_type = "text/plain"
-                    else:
-                        export_mime_type = "text/plain"
+                export_mime_type = mime_type or _EXPORT_MIME_MAP.get(file_mime_type, "text/plain")
                 
-                logger.debug(f"Exporting Google Doc with ID {file_id} as {export_mime_type}")
-                content = drive_service.files().export(
+                logger.debug("Exporting Google Doc with ID %s as %s", file_id, export_mime_type)
+                content = GoogleDriveUtils._execute(drive_service.files().export(
                     fileId=file_id,
                     mimeType=export_mime_type
-                ).execute()
+                ))
                 
                 # For text-based MIME types, convert to string
                 if export_mime_type.startswith('text/'):
                     content = content.decode('utf-8')
             else:
-                # Download the file content
-                logger.debug(f"Downloading file with ID: {file_id}")
-                request = drive_service.files().get_media(fileId=file_id)
-                file_content = BytesIO()
-                downloader = MediaIoBaseDownload(file_content, request)
-                done = False
-                while not done:
-                    status, done = downloader.next_chunk()
-                
-                content = file_content.getvalue()
-                
-                # For text-based MIME types, convert to string
-                if is_text:
-                    content = content.decode('utf-8')
+                # Download the file content, converting it to string for text-based MIME types
+                logger.debug("Downloading file with ID: %s", file_id)
+                content = GoogleDriveUtils._read_media(drive_service, file_id, file.get('size'), is_text)
             
-            logger.info(f"Retrieved content for file: {file_name}")
+            logger.info("Retrieved content for file: %s", file_name)
             
             return {
                 "file_name": file_name,
@@ -262,11 +670,11 @@ class GoogleDriveUtils:
                 "content": content
             }
         except Exception as e:
-            logger.error(f"Error getting file content: {str(e)}")
+            logger.error("Error getting file content: %s", e)
             raise
     
     @staticmethod
-    def download_file(drive_service, file_id, mime_type=None):
+    def download_file(drive_service, file_id, mime_type=None, file_name=None, file_mime_type=None):
         """
         Download a file from Google Drive.
         
@@ -274,49 +682,39 @@ class GoogleDriveUtils:
             drive_service: The Google Drive service.
             file_id: The ID of the file.
             mime_type: The MIME type for exporting Google Docs.
+            file_name: The name of the file, e.g. from a listing (optional).
+            file_mime_type: The MIME type of the file, e.g. from a listing (optional). The file details are not requested when both are given.
             
         Returns:
             A dictionary containing the file content and metadata.
         """
         try:
-            # Get the file details first
-            logger.debug(f"Getting details for file with ID: {file_id}")
-            file = drive_service.files().get(
-                fileId=file_id,
-                fields="id, name, mimeType"
-            ).execute()
+            # Get the file details first, unless the caller already knows them
+            file = GoogleDriveUtils._get_download_metadata(drive_service, file_id, file_name, file_mime_type)
             
             file_name = file.get('name')
             file_mime_type = file.get('mimeType')
             
             # If a specific MIME type is requested and the file is a Google Doc, export it
-            if mime_type and file_mime_type.startswith('application/vnd.google-apps'):
-                logger.debug(f"Exporting Google Doc with ID {file_id} as {mime_type}")
-                content = drive_service.files().export(
+            if mime_type and file_mime_type.startswith(_GAPPS_PREFIX):
+                logger.debug("Exporting Google Doc with ID %s as %s", file_id, mime_type)
+                content = GoogleDriveUtils._execute(drive_service.files().export(
                     fileId=file_id,
                     mimeType=mime_type
-                ).execute()
+                ))
                 
                 # For text-based MIME types, convert to string
                 if mime_type.startswith('text/') or mime_type == 'application/json':
                     content = content.decode('utf-8')
             else:
                 # Download the file content
-                logger.debug(f"Downloading file with ID: {file_id}")
-                request = drive_service.files().get_media(fileId=file_id)
-                file_content = BytesIO()
-                downloader = MediaIoBaseDownload(file_content, request)
-                done = False
-                while not done:
-                    status, done = downloader.next_chunk()
-                
-                content = file_content.getvalue()
+                logger.debug("Downloading file with ID: %s", file_id)
                 
                 # For text-based MIME types, convert to string
-                if file_mime_type.startswith('text/') or file_mime_type == 'application/json':
-                    content = content.decode('utf-8')
+                is_text = file_mime_type.startswith('text/') or file_mime_type == 'application/json'
+                content = GoogleDriveUtils._read_media(drive_service, file_id, file.get('size'), is_text)
             
-            logger.info(f"Downloaded file: {file_name}")
+            logger.info("Downloaded file: %s", file_name)
             
             return {
                 "file_name": file_name,
@@ -324,11 +722,158 @@ class GoogleDriveUtils:
                 "content": content
             }
         except Exception as e:
-            logger.error(f"Error downloading file: {str(e)}")
+            logger.error("Error downloading file: %s", e)
             raise
     
     @staticmethod
-    def upload_file(drive_service, file_path, folder_id=None):
+    def _get_download_metadata(drive_service, file_id, file_name=None, file_mime_type=None):
+        """
+        Get the metadata needed to download a file, requesting it only if the caller does not know it.
+        
+        Args:
+            drive_service: The Google Drive service.
+            file_id: The ID of the file.
+            file_name: The name of the file (optional).
+            file_mime_type: The MIME type of the file (optional).
+            
+        Returns:
+            A file resource with at least the name and mimeType fields, and the size when it was requested.
+        """
+        if file_name and file_mime_type:
+            return {'id': file_id, 'name': file_name, 'mimeType': file_mime_type}
+        
+        logger.debug("Getting details for file with ID: %s", file_id)
+        return GoogleDriveUtils._fetch_file_metadata(drive_service, file_id, _DOWNLOAD_META_FIELDS)
+    
+    @staticmethod
+    def _read_media(drive_service, file_id, size=None, is_text=False):
+        """
+        Read the content of a file stored in Google Drive.
+        Small files are fetched in a single request, larger or unsized ones are streamed in chunks.
+        
+        Args:
+            drive_service: The Google Drive service.
+            file_id: The ID of the file.
+            size: The size of the file in bytes, as reported by the Drive API (optional).
+            is_text: Whether to decode the content as UTF-8 text.
+            
+        Returns:
+            The file content, as a string for text or as bytes otherwise.
+        """
+        if size is not None and int(size) < SMALL_FILE_SIZE:
+            content = GoogleDriveUtils._execute(drive_service.files().get_media(fileId=file_id))
+            return content.decode('utf-8') if is_text else content
+        
+        chunks = GoogleDriveUtils.iter_download(drive_service, file_id)
+        
+        # Decode text as the chunks arrive
+        if is_text:
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            return ''.join(decoder.decode(chunk) for chunk in chunks) + decoder.decode(b'', final=True)
+        
+        return b''.join(chunks)
+    
+    @staticmethod
+    def iter_download(drive_service, file_id, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Download a file from Google Drive chunk by chunk, without buffering it whole.
+        
+        Args:
+            drive_service: The Google Drive service.
+            file_id: The ID of the file.
+            chunk_size: The number of bytes to request per HTTP range request.
+            
+        Yields:
+            The file content, as successive bytes chunks.
+        """
+        yield from GoogleDriveUtils._iter_media(drive_service.files().get_media(fileId=file_id), chunk_size)
+    
+    @staticmethod
+    def stream_file_content(drive_service, file_id, mime_type=None, chunk_size=DOWNLOAD_CHUNK_SIZE):
+        """
+        Stream the content of a file from Google Drive, exporting Google Apps documents.
+        Callers writing the content elsewhere never hold the whole file in memory.
+        
+        Args:
+            drive_service: The Google Drive service.
+            file_id: The ID of the file.
+            mime_type: The MIME type for exporting Google Docs (optional).
+            chunk_size: The number of bytes to request per HTTP range request.
+            
+        Yields:
+            The file content, as successive bytes chunks.
+        """
+        file = GoogleDriveUtils._fetch_file_metadata(drive_service, file_id, _DOWNLOAD_META_FIELDS)
+        file_mime_type = file.get('mimeType')
+        
+        if file_mime_type.startswith(_GAPPS_PREFIX):
+            export_mime_type = mime_type or _EXPORT_MIME_MAP.get(file_mime_type, "text/plain")
+            logger.debug("Streaming export of Google Doc with ID %s as %s", file_id, export_mime_type)
+            request = drive_service.files().export_media(fileId=file_id, mimeType=export_mime_type)
+        else:
+            logger.debug("Streaming file with ID: %s", file_id)
+            request = drive_service.files().get_media(fileId=file_id)
+        
+        yield from GoogleDriveUtils._iter_media(request, chunk_size)
+    
+    @staticmethod
+    def _iter_media(request, chunk_size):
+        """
+        Execute a media download request chunk by chunk with HTTP range requests.
+        
+        Args:
+            request: The media download request, e.g. from files().get_media().
+            chunk_size: The number of bytes to request per HTTP range request.
+            
+        Yields:
+            The content, as successive bytes chunks.
+        """
+        start = 0
+        while True:
+            response, content = GoogleDriveUtils._fetch_range(request, start, chunk_size)
+            
+            # An unsatisfiable range means there is nothing left to read
+            if response.status == 416:
+                return
+            
+            if content:
+                yield content
+            
+            # A 200 response carries the whole content, e.g. for exports which do not support ranges
+            if response.status == 200:
+                return
+            
+            start += len(content)
+            total_size = response.get('content-range', '').rpartition('/')[2]
+            if not content or (total_size.isdigit() and start >= int(total_size)):
+                return
+    
+    @staticmethod
+    @drive_retry()
+    def _fetch_range(request, start, length):
+        """
+        Fetch a byte range of a media download, retrying only this range on errors.
+        
+        Args:
+            request: The media download request.
+            start: The offset of the first byte.
+            length: The number of bytes to request.
+            
+        Returns:
+            A tuple of the HTTP response and its content.
+        """
+        from googleapiclient.errors import HttpError
+        
+        headers = dict(request.headers)
+        headers['range'] = f"bytes={start}-{start + length - 1}"
+        response, content = request.http.request(request.uri, method='GET', headers=headers)
+        if response.status not in (200, 206, 416):
+            raise HttpError(response, content, uri=request.uri)
+        
+        return response, content
+    
+    @staticmethod
+    def upload_file(drive_service, file_path, folder_id=None, resumable_threshold=RESUMABLE_UPLOAD_THRESHOLD):
         """
         Upload a file to Google Drive.
         
@@ -336,33 +881,98 @@ class GoogleDriveUtils:
             drive_service: The Google Drive service.
             file_path: The path to the file to upload.
             folder_id: The ID of the folder to upload to (optional).
+            resumable_threshold: The size in bytes from which the file is uploaded in resumable chunks rather than in a single request.
             
         Returns:
             The ID of the uploaded file.
         """
+        from googleapiclient.http import MediaFileUpload
+        
         try:
             # Create file metadata
             file_metadata = {'name': os.path.basename(file_path)}
             if folder_id:
                 file_metadata['parents'] = [folder_id]
             
-            # Create media
-            media = MediaFileUpload(file_path, resumable=True)
+            # Create media, resumable only for files large enough to be worth the extra round-trip
+            resumable = os.path.getsize(file_path) >= resumable_threshold
+            media = MediaFileUpload(file_path, resumable=resumable, chunksize=UPLOAD_CHUNK_SIZE)
             
             # Upload the file
-            logger.debug(f"Uploading file: {file_path}")
-            file = drive_service.files().create(
+            logger.debug("Uploading file: %s (resumable: %s)", file_path, resumable)
+            request = drive_service.files().create(
                 body=file_metadata,
                 media_body=media,
                 fields='id'
-            ).execute()
+            )
+            if resumable:
+                file = None
+                while file is None:
+                    status, file = GoogleDriveUtils._next_chunk(request)
+                    if status:
+                        logger.debug("Uploaded %s%% of %s", int(status.progress() * 100), file_path)
+            else:
+                file = GoogleDriveUtils._execute(request)
             
             file_id = file.get('id')
-            logger.info(f"Uploaded file with ID: {file_id}")
+            GoogleDriveUtils.invalidate(file_id, folder_id)
+            logger.info("Uploaded file with ID: %s", file_id)
             
             return file_id
         except Exception as e:
-            logger.error(f"Error uploading file: {str(e)}")
+            logger.error("Error uploading file: %s", e)
+            raise
+    
+    @staticmethod
+    def upload_stream(drive_service, source, file_name, folder_id=None, mime_type='application/octet-stream'):
+        """
+        Upload a stream to Google Drive, reading the source while earlier chunks are uploaded.
+        
+        Args:
+            drive_service: The Google Drive service.
+            source: A readable binary stream, an iterable of bytes chunks, or a function opening one from the reading thread.
+                To copy a Drive file, pass a function creating its own service, e.g.
+                lambda: GoogleDriveUtils.iter_download(GoogleDriveUtils.create_drive_service(access_token), file_id).
+            file_name: The name of the file to create.
+            folder_id: The ID of the folder to upload to (optional).
+            mime_type: The MIME type of the uploaded content.
+            
+        Returns:
+            The ID of the uploaded file.
+        """
+        from utils.stream_upload import QueuedStreamUpload
+        
+        try:
+            # Create file metadata
+            file_metadata = {'name': file_name}
+            if folder_id:
+                file_metadata['parents'] = [folder_id]
+            
+            # Create media fed by a background reader
+            media = QueuedStreamUpload(source, mimetype=mime_type)
+            
+            # Upload the file chunk by chunk
+            logger.debug("Uploading stream as: %s", file_name)
+            request = drive_service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id'
+            )
+            try:
+                file = None
+                while file is None:
+                    status, file = GoogleDriveUtils._next_chunk(request)
+            finally:
+                # Stop the background reader if the upload failed
+                media.close()
+            
+            file_id = file.get('id')
+            GoogleDriveUtils.invalidate(file_id, folder_id)
+            logger.info("Uploaded file with ID: %s", file_id)
+            
+            return file_id
+        except Exception as e:
+            logger.error("Error uploading stream: %s", e)
             raise
     
     @staticmethod
@@ -379,11 +989,191 @@ class GoogleDriveUtils:
         """
         try:
             # Delete the file
-            logger.debug(f"Deleting file with ID: {file_id}")
-            drive_service.files().delete(fileId=file_id).execute()
-            logger.info(f"Deleted file with ID: {file_id}")
+            logger.debug("Deleting file with ID: %s", file_id)
+            try:
+                GoogleDriveUtils._execute(drive_service.files().delete(fileId=file_id))
+            finally:
+                # The file may have been deleted even if the call failed, e.g. on a network error
+                GoogleDriveUtils.invalidate(file_id)
+            logger.info("Deleted file with ID: %s", file_id)
             
             return True
         except Exception as e:
-            logger.error(f"Error deleting file: {str(e)}")
-            raise 
\ No newline at end of file
+            logger.error("Error deleting file: %s", e)
+            raise
+    
+    @staticmethod
+    def batch_delete(drive_service, file_ids):
+        """
+        Delete several files from Google Drive using batch requests.
+        
+        Args:
+            drive_service: The Google Drive service.
+            file_ids: The IDs of the files to delete.
+            
+        Returns:
+            True if all the files were deleted successfully.
+        """
+        try:
+            logger.debug("Deleting %s files in batch", len(file_ids))
+            try:
+                GoogleDriveUtils.batch_execute(drive_service, {
+                    file_id: drive_service.files().delete(fileId=file_id)
+                    for file_id in file_ids
+                })
+            finally:
+                # Some files may have been deleted even if a call failed
+                for file_id in file_ids:
+                    GoogleDriveUtils.invalidate(file_id)
+            logger.info("Deleted %s files", len(file_ids))
+            
+            return True
+        except Exception as e:
+            logger.error("Error deleting files: %s", e)
+            raise
+    
+    @staticmethod
+    def download_many(access_token, file_ids, mime_type=None):
+        """
+        Download several files from Google Drive concurrently.
+        
+        Args:
+            access_token: The OAuth 2.0 access token.
+            file_ids: The IDs of the files to download.
+            mime_type: The MIME type for exporting Google Docs.
+            
+        Returns:
+            A list of dictionaries containing the file content and metadata, in the order of file_ids.
+        """
+        return asyncio.run(GoogleDriveUtils.adownload_many(access_token, file_ids, mime_type))
+    
+    @staticmethod
+    async def adownload_many(access_token, file_ids, mime_type=None):
+        """
+        Download several files from Google Drive, overlapping the HTTP round-trips.
+        At most MAX_CONCURRENT_REQUESTS requests are in flight at once.
+        
+        Args:
+            access_token: The OAuth 2.0 access token.
+            file_ids: The IDs of the files to download.
+            mime_type: The MIME type for exporting Google Docs.
+            
+        Returns:
+            A list of dictionaries containing the file content and metadata, in the order of file_ids.
+        """
+        import aiohttp
+        
+        try:
+            logger.debug("Downloading %s files concurrently", len(file_ids))
+            headers = dict(GZIP_HEADERS, Authorization=f"Bearer {access_token}")
+            timeout = aiohttp.ClientTimeout(sock_connect=HTTP_TIMEOUT, sock_read=HTTP_TIMEOUT)
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+            async with aiohttp.ClientSession(headers=headers, raise_for_status=True, timeout=timeout) as session:
+                files = await asyncio.gather(*[
+                    GoogleDriveUtils._adownload_one(session, semaphore, file_id, mime_type)
+                    for file_id in file_ids
+                ])
+            
+            logger.info("Downloaded %s files", len(files))
+            return list(files)
+        except Exception as e:
+            logger.error("Error downloading files: %s", e)
+            raise
+    
+    @staticmethod
+    async def _adownload_one(session, semaphore, file_id, mime_type=None):
+        """
+        Download a single file using an open aiohttp session.
+        
+        Args:
+            session: The aiohttp session carrying the authorization header.
+            semaphore: The semaphore limiting the number of concurrent requests.
+            file_id: The ID of the file.
+            mime_type: The MIME type for exporting Google Docs.
+            
+        Returns:
+            A dictionary containing the file content and metadata.
+        """
+        file_url = f"{DRIVE_FILES_URL}/{quote(file_id, safe='')}"
+        
+        # Get the file details first
+        file = await GoogleDriveUtils._aget(session, semaphore, file_url, {"fields": _DOWNLOAD_META_FIELDS}, as_json=True)
+        
+        file_name = file.get('name')
+        file_mime_type = file.get('mimeType')
+        
+        # If a specific MIME type is requested and the file is a Google Doc, export it
+        if mime_type and file_mime_type.startswith(_GAPPS_PREFIX):
+            url = f"{file_url}/export"
+            params = {"mimeType": mime_type}
+            content_mime_type = mime_type
+        else:
+            url = file_url
+            params = {"alt": "media"}
+            content_mime_type = file_mime_type
+        
+        content = await GoogleDriveUtils._aget(session, semaphore, url, params)
+        
+        # For text-based MIME types, convert to string
+        if content_mime_type.startswith('text/') or content_mime_type == 'application/json':
+            content = content.decode('utf-8')
+        
+        return {
+            "file_name": file_name,
+            "mime_type": mime_type or file_mime_type,
+            "content": content
+        }
+    
+    @staticmethod
+    async def _aget(session, semaphore, url, params, as_json=False):
+        """
+        Send a GET request with an aiohttp session, retrying it like drive_retry does
+        on rate limiting, transient server errors and network errors.
+        
+        Args:
+            session: The aiohttp session, raising on error statuses.
+            semaphore: The semaphore limiting the number of concurrent requests, released while waiting to retry.
+            url: The URL to get.
+            params: The query parameters.
+            as_json: Whether to parse the response as JSON rather than return its bytes.
+            
+        Returns:
+            The parsed JSON response, or the response content.
+        """
+        import aiohttp
+        
+        for attempt in range(1, MAX_TRIES + 1):
+            try:
+                async with semaphore:
+                    async with session.get(url, params=params) as response:
+                        return await (response.json() if as_json else response.read())
+            except aiohttp.ClientResponseError as e:
+                if e.status not in RETRYABLE_STATUSES or attempt == MAX_TRIES:
+                    raise
+                
+                delay = get_retry_after(e.headers or {})
+                if delay is None:
+                    delay = backoff_delay(attempt)
+                delay = min(MAX_DELAY, delay)
+                logger.warn("Google Drive returned HTTP %s for %s, retrying in %.1fs (attempt %s/%s)", e.status, url, delay, attempt, MAX_TRIES)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == MAX_TRIES:
+                    raise
+                
+                delay = backoff_delay(attempt)
+                logger.warn("Network error for %s: %s, retrying in %.1fs (attempt %s/%s)", url, e, delay, attempt, MAX_TRIES)
+            
+            await asyncio.sleep(delay)
+    
+    @staticmethod
+    def invalidate(file_id, folder_id=None):
+        """
+        Drop the cached data that a change to a file may have made stale.
+        
+        Args:
+            file_id: The ID of the created, modified or deleted file.
+            folder_id: The ID of the folder containing the file, to keep the listings of the other folders cached on disk (optional).
+        """
+        _metadata_cache.invalidate(lambda key: key[1] == file_id)
+        _search_cache.invalidate()
+        _listing_cache.invalidate(folder_id)
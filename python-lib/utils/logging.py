@@ -43,7 +43,15 @@ class LazyLogger:
         if not isinstance(level_constant, int):
             raise ValueError(f'Invalid log level: {level}')
         cls._logger.setLevel(level_constant)
-        cls._logger.info(f"Logging level changed to {level.upper()}")
+        cls._logger.info("Logging level changed to %s", level.upper())
+
+    def isEnabledFor(self, level):
+        """
+        Checks whether a message of the given level would be emitted.
+        :param level: The logging level constant (e.g., logging.DEBUG)
+        """
+        self._initialize_logger()
+        return self._logger.isEnabledFor(level)
 
     def debug(self, msg, *args, **kwargs):
         self._initialize_logger()
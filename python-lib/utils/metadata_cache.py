@@ -0,0 +1,121 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import orjson
+from utils.gdrive_cache import CACHE_DIR, make_private_dir
+from utils.logging import logger
+
+# SQLite database keeping Drive API responses across processes
+DB_PATH = os.path.join(CACHE_DIR, "metadata.sqlite3")
+
+# Number of seconds a cached response stays valid
+DEFAULT_TTL = 300
+
+
+def make_key(*parts):
+    """
+    Build a cache key from the parts identifying a request.
+
+    Args:
+        parts: The values identifying the request, e.g. a token hash, a query and a page size.
+
+    Returns:
+        A 128-bit BLAKE2b hex digest of the JSON encoding of the parts, which tells None from "None".
+    """
+    return hashlib.blake2b(orjson.dumps(parts), digest_size=16).hexdigest()
+
+
+class MetadataCache:
+    """
+    Disk cache of Drive API responses stored in SQLite, shared by successive runs of the tool.
+    Each response may belong to a scope, such as the folder it lists, to be invalidated when that scope changes.
+    Failures are logged and ignored, as the cache is only an optimization.
+    """
+
+    def __init__(self, path=DB_PATH, ttl=DEFAULT_TTL):
+        """
+        Args:
+            path: The path of the SQLite database.
+            ttl: The number of seconds a cached response stays valid.
+        """
+        self.path = path
+        self.ttl = ttl
+        # SQLite connections cannot be shared across threads: each thread opens its own
+        self._local = threading.local()
+
+    def _connect(self):
+        """
+        Get the connection of the current thread, opening it and creating the table on first use.
+
+        Returns:
+            The sqlite3 connection.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            make_private_dir(os.path.dirname(self.path))
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, scope TEXT, expires INTEGER, body BLOB)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses (scope)")
+            # Drop the responses that expired since the last run
+            connection.execute("DELETE FROM responses WHERE expires <= ?", (int(time.time()),))
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        """
+        Get a cached response.
+
+        Args:
+            key: The key of the response, from make_key.
+
+        Returns:
+            The cached response, or None if it is missing or expired.
+        """
+        try:
+            row = self._connect().execute(
+                "SELECT body FROM responses WHERE key = ? AND expires > ?",
+                (key, int(time.time()))
+            ).fetchone()
+            return orjson.loads(row[0]) if row else None
+        except (sqlite3.Error, OSError, orjson.JSONDecodeError) as e:
+            logger.debug("Could not read cached response %s: %s", key, e)
+            return None
+
+    def set(self, key, value, scope=None):
+        """
+        Cache a response.
+
+        Args:
+            key: The key of the response, from make_key.
+            value: The response, serializable to JSON.
+            scope: The scope of the response, e.g. the ID of the listed folder (optional).
+        """
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO responses (key, scope, expires, body) VALUES (?, ?, ?, ?)",
+                (key, scope, int(time.time() + self.ttl), orjson.dumps(value))
+            )
+        except (sqlite3.Error, OSError, TypeError) as e:
+            logger.debug("Could not cache response %s: %s", key, e)
+
+    def invalidate(self, scope=None):
+        """
+        Remove cached responses.
+
+        Args:
+            scope: The scope that changed (optional). Its responses are removed along with the unscoped ones,
+                which may cover any scope. All responses are removed by default.
+        """
+        try:
+            if scope is None:
+                self._connect().execute("DELETE FROM responses")
+            else:
+                self._connect().execute("DELETE FROM responses WHERE scope IS NULL OR scope = ?", (scope,))
+        except (sqlite3.Error, OSError) as e:
+            logger.debug("Could not invalidate cached responses: %s", e)
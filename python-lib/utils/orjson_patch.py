@@ -0,0 +1,44 @@
+import json
+import orjson
+from utils.logging import logger
+
+
+class OrjsonModule:
+    """
+    Stand-in for the json module that parses and serializes with orjson.
+    Calls with formatting options, and any other attribute, fall back to the json module.
+    """
+
+    def __getattr__(self, name):
+        return getattr(json, name)
+
+    @staticmethod
+    def loads(s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        if kwargs:
+            return json.dumps(obj, **kwargs)
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except TypeError:
+            # orjson rejects some values json accepts, such as non-string keys or integers above 64 bits
+            return json.dumps(obj)
+
+
+def install():
+    """
+    Make googleapiclient parse and serialize the API JSON payloads with orjson:
+    request and response bodies (model), error bodies checked for retries (http), and error details (errors).
+    """
+    import googleapiclient.errors
+    import googleapiclient.http
+    import googleapiclient.model
+
+    for module in (googleapiclient.model, googleapiclient.http, googleapiclient.errors):
+        if not isinstance(module.json, OrjsonModule):
+            module.json = OrjsonModule()
+            logger.debug("%s JSON payloads now handled by orjson", module.__name__)
@@ -0,0 +1,94 @@
+import time
+import random
+import socket
+import functools
+from utils.logging import logger
+
+# HTTP statuses returned by Google Drive for rate limiting and transient server errors
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Network errors worth retrying, such as a socket timing out or a connection reset by Google Drive
+RETRYABLE_ERRORS = (socket.timeout, ConnectionError)
+
+# Default maximum number of attempts of a call
+MAX_TRIES = 6
+
+# Default maximum delay in seconds between two attempts
+MAX_DELAY = 60.0
+
+
+def drive_retry(max_tries=MAX_TRIES, base=1.0, cap=MAX_DELAY, network_errors=True):
+    """
+    Decorator retrying a function calling the Google Drive API on rate limiting, transient server errors and network errors.
+    Each retry waits for the delay given by the Retry-After header when the response has one,
+    and otherwise for an exponential backoff with jitter.
+
+    Args:
+        max_tries: The maximum number of calls, the last error being re-raised.
+        base: The backoff delay in seconds before the first retry, doubled on each retry.
+        cap: The maximum delay in seconds between two calls.
+        network_errors: Whether to retry network errors. A call failing with one may still have been
+            applied by Google Drive, so only calls safe to repeat should retry them.
+
+    Returns:
+        The decorator.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            from googleapiclient.errors import HttpError
+
+            for attempt in range(1, max_tries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except HttpError as e:
+                    if e.resp.status not in RETRYABLE_STATUSES or attempt == max_tries:
+                        raise
+
+                    delay = get_retry_after(e.resp)
+                    if delay is None:
+                        delay = backoff_delay(attempt, base, cap)
+                    delay = min(cap, delay)
+
+                    logger.warn("Google Drive returned HTTP %s in %s, retrying in %.1fs (attempt %s/%s)", e.resp.status, func.__name__, delay, attempt, max_tries)
+                    time.sleep(delay)
+                except RETRYABLE_ERRORS as e:
+                    if not network_errors or attempt == max_tries:
+                        raise
+
+                    delay = backoff_delay(attempt, base, cap)
+                    logger.warn("Network error in %s: %s, retrying in %.1fs (attempt %s/%s)", func.__name__, e, delay, attempt, max_tries)
+                    time.sleep(delay)
+        return wrapper
+    return decorator
+
+
+def backoff_delay(attempt, base=1.0, cap=MAX_DELAY):
+    """
+    Get the delay before a retry, growing exponentially with the attempt number and randomized by a jitter.
+
+    Args:
+        attempt: The number of the failed attempt, starting at 1.
+        base: The delay in seconds after the first attempt.
+        cap: The maximum delay in seconds.
+
+    Returns:
+        The delay in seconds.
+    """
+    return min(cap, base * 2 ** (attempt - 1) + random.uniform(0, 1))
+
+
+def get_retry_after(headers):
+    """
+    Get the delay requested by the Retry-After header of an error response.
+
+    Args:
+        headers: The headers of the response, e.g. the resp of an HttpError.
+
+    Returns:
+        The delay in seconds, or None if the header is missing or not a number of seconds.
+    """
+    try:
+        return max(0.0, float(headers.get('retry-after')))
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,151 @@
+import queue
+import threading
+from googleapiclient.http import MediaUpload
+
+# Size of the chunks read from the source and sent to Google Drive (a multiple of 256 KiB)
+STREAM_CHUNK_SIZE = 1 << 20
+
+# Maximum number of chunks read ahead of the upload
+STREAM_QUEUE_SIZE = 8
+
+# Number of seconds between two checks of whether the upload was stopped, while the queue is full
+_PUT_TIMEOUT = 0.1
+
+
+class StreamSourceError(Exception):
+    """
+    Error raised when the source of a streamed upload fails. It is never retried, as the content read
+    so far must not be uploaded as the whole file.
+    """
+
+
+class QueuedStreamUpload(MediaUpload):
+    """
+    Resumable media upload fed by a producer thread through a bounded queue.
+
+    The producer reads the source while the previous chunks are being sent, so
+    reading the source and uploading to Google Drive overlap instead of alternating.
+    """
+
+    def __init__(self, source, mimetype='application/octet-stream', chunksize=STREAM_CHUNK_SIZE, queue_size=STREAM_QUEUE_SIZE):
+        """
+        Start reading the source in the background.
+
+        Args:
+            source: A readable binary stream, an iterable of bytes chunks, or a function called by the reading thread
+                to open one. Sources reading from Google Drive must be opened by such a function, with a Drive service
+                created by that thread, as Drive services cannot be shared across threads.
+            mimetype: The MIME type of the uploaded content.
+            chunksize: The number of bytes to read and upload at a time.
+            queue_size: The maximum number of chunks read ahead of the upload, larger chunks from the source being split.
+        """
+        self._source = source
+        self._mimetype = mimetype
+        self._chunksize = chunksize
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self._eof = False
+
+        # Bytes received from the producer but not yet acknowledged by Google Drive
+        self._buffer = bytearray()
+        self._buffer_offset = 0
+
+        self._producer = threading.Thread(target=self._produce, daemon=True)
+        self._producer.start()
+
+    def _produce(self):
+        """
+        Read the source into the queue in chunks of at most chunksize bytes, then put None to mark the end of the stream.
+        Stop early if the upload is closed, closing the source if this thread opened it.
+        """
+        source = None
+        try:
+            source = self._source() if callable(self._source) else self._source
+            if hasattr(source, 'read'):
+                chunks = iter(lambda: source.read(self._chunksize), b'')
+            else:
+                chunks = source
+            for chunk in chunks:
+                for start in range(0, len(chunk), self._chunksize):
+                    if not self._put(chunk[start:start + self._chunksize]):
+                        return
+        except Exception as e:
+            self._error = e
+        finally:
+            if callable(self._source) and hasattr(source, 'close'):
+                source.close()
+            self._put(None)
+
+    def _put(self, item):
+        """
+        Put an item in the queue, waiting for room unless the upload is closed.
+
+        Args:
+            item: The chunk to put, or None for the end of the stream.
+
+        Returns:
+            False if the upload was closed before the item could be put.
+        """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=_PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def close(self):
+        """
+        Stop reading the source, e.g. once the upload failed. The reading thread exits shortly after.
+        """
+        self._stop.set()
+
+    def chunksize(self):
+        return self._chunksize
+
+    def mimetype(self):
+        return self._mimetype
+
+    def resumable(self):
+        return True
+
+    def getbytes(self, begin, length):
+        """
+        Get bytes from the stream, waiting for the producer if needed.
+
+        Args:
+            begin: The offset of the first byte, which must not precede an already acknowledged byte.
+            length: The maximum number of bytes to return.
+
+        Returns:
+            The requested bytes, shorter than length only at the end of the stream.
+
+        Raises:
+            StreamSourceError: If the source failed, on this call and all the next ones, so that a retried upload
+                never mistakes the bytes read before the failure for the whole content.
+        """
+        self._raise_source_error()
+        if begin < self._buffer_offset:
+            raise ValueError(f"Cannot rewind a streamed upload to offset {begin}")
+
+        # Drop the bytes Google Drive has already acknowledged
+        del self._buffer[:begin - self._buffer_offset]
+        self._buffer_offset = begin
+
+        while len(self._buffer) < length and not self._eof:
+            chunk = self._queue.get()
+            if chunk is None:
+                self._eof = True
+                self._raise_source_error()
+            else:
+                self._buffer.extend(chunk)
+
+        return bytes(self._buffer[:length])
+
+    def _raise_source_error(self):
+        """
+        Raise the error of the source, if reading it failed.
+        """
+        if self._error is not None:
+            raise StreamSourceError(f"Reading the upload source failed: {self._error}") from self._error
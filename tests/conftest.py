@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The plugin libraries are importable from python-lib, as in Dataiku
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "python-lib"))
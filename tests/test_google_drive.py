@@ -0,0 +1,12 @@
+import pytest
+from utils.google_drive import GoogleDriveUtils
+
+
+def test_parents_query_accepts_drive_ids():
+    assert GoogleDriveUtils._parents_query("1aB_c-D") == "'1aB_c-D' in parents"
+
+
+@pytest.mark.parametrize("folder_id", ["abc\n", "abc' or 'x", "", "a b"])
+def test_parents_query_rejects_invalid_ids(folder_id):
+    with pytest.raises(ValueError):
+        GoogleDriveUtils._parents_query(folder_id)
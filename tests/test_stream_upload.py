@@ -0,0 +1,68 @@
+import json
+import pytest
+from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMockSequence
+from utils.google_drive import GoogleDriveUtils
+from utils.stream_upload import QueuedStreamUpload, StreamSourceError
+
+UPLOAD_URI = "https://www.googleapis.com/upload/drive/v3/files?upload_id=test"
+
+
+def make_drive_service(responses):
+    """
+    Build a Drive service replaying canned responses, the resumable upload session being started first.
+    """
+    http = HttpMockSequence([({'status': '200', 'location': UPLOAD_URI}, '')] + responses)
+    return build('drive', 'v3', http=http, static_discovery=True, cache_discovery=False)
+
+
+def failing_source():
+    yield b'x' * (300 * 1024)
+    raise ConnectionResetError("source connection reset")
+
+
+def test_upload_stream_fails_when_the_source_fails():
+    # Google Drive would finalize the upload if it received the partial content
+    drive_service = make_drive_service([({'status': '200'}, json.dumps({'id': 'truncated'}))])
+
+    with pytest.raises(StreamSourceError):
+        GoogleDriveUtils.upload_stream(drive_service, failing_source(), "file.bin")
+
+
+def test_source_error_is_raised_on_every_read():
+    media = QueuedStreamUpload(failing_source(), chunksize=1024 * 1024)
+
+    for _ in range(2):
+        with pytest.raises(StreamSourceError):
+            media.getbytes(0, media.chunksize())
+
+
+def test_reader_stops_when_the_upload_fails():
+    def endless_source():
+        while True:
+            yield b'x' * 1024
+
+    drive_service = make_drive_service([({'status': '400'}, json.dumps({'error': {'message': 'Bad request'}}))])
+    media = QueuedStreamUpload(endless_source(), chunksize=256 * 1024, queue_size=2)
+    request = drive_service.files().create(body={'name': "file.bin"}, media_body=media, fields='id')
+
+    with pytest.raises(HttpError):
+        request.next_chunk()
+    media.close()
+
+    media._producer.join(timeout=5)
+    assert not media._producer.is_alive()
+
+
+def test_chunks_are_split_to_the_chunk_size():
+    media = QueuedStreamUpload([b'x' * 1000], chunksize=256, queue_size=8)
+    media._producer.join(timeout=5)
+
+    sizes = []
+    while True:
+        chunk = media._queue.get()
+        if chunk is None:
+            break
+        sizes.append(len(chunk))
+    assert sizes == [256, 256, 256, 232]